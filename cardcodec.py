@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Card codec shared by both engines and by anything that reads or writes card
+text.
+
+Cards are integers 0..51: the residue mod 13 is the rank (0 is Ace) and the
+integer division by 13 is the suit (0 spades, 1 clubs, 2 diamonds, 3
+hearts). Their text form is suit letter plus 1-indexed rank, e.g. "S1" for
+the ace of spades and "H13" for the king of hearts. A set of cards can also
+be a bitmask with bit c set for card c.
+
+Every lookup table is built once at import: name to card, card to name,
+card and rank bitmasks, and for each byte of a bitmask the cards (and names)
+that byte stands for. That lets whole hands go to and from text or masks
+with one dict lookup per card, or one table lookup per byte.
+"""
+
+suitLetters = ["S", "C", "D", "H"]
+
+"""
+names[c] is the text form of card c; nameToCard maps it back.
+"""
+names = [suit + str(rank + 1) for suit in suitLetters for rank in range(13)]
+nameToCard = dict((name, card) for card, name in enumerate(names))
+
+cardMasks = [1 << card for card in range(52)]
+
+"""
+rankMasks[r] has the bits of all four cards of rank r set.
+"""
+rankMasks = [cardMasks[r] | cardMasks[r + 13] | cardMasks[r + 26] | cardMasks[r + 39]
+             for r in range(13)]
+
+fullMask = (1 << 52) - 1
+
+"""
+chunkCards[k][b] lists the cards whose bits are set in byte value b when it
+sits at byte k of a mask; chunkNames[k][b] lists their names.
+"""
+numChunks = 7
+chunkCards = [[tuple(8 * k + bit for bit in range(8)
+                     if b & (1 << bit) and 8 * k + bit < 52)
+               for b in range(256)]
+              for k in range(numChunks)]
+chunkNames = [[tuple(names[card] for card in chunk) for chunk in table]
+              for table in chunkCards]
+
+
+def cardsToMask(cards):
+    """
+    Returns the bitmask of a collection of cards.
+    """
+    mask = 0
+    for card in cards:
+        mask |= cardMasks[card]
+    return mask
+
+
+def maskToCards(mask):
+    """
+    Returns the cards in a bitmask as a sorted list.
+    """
+    cards = []
+    k = 0
+    while mask:
+        b = mask & 255
+        if b:
+            cards.extend(chunkCards[k][b])
+        mask >>= 8
+        k += 1
+    return cards
+
+
+def parseNames(words):
+    """
+    Returns the cards named by a sequence of card names (any case). Raises
+    ValueError if one isn't a card.
+    """
+    try:
+        return [nameToCard[word.upper()] for word in words]
+    except KeyError, e:
+        raise ValueError("Not a card: " + str(e.args[0]))
+
+
+def parseCards(text):
+    """
+    Returns the cards in a whitespace-separated string, e.g. "S1 d12 C5",
+    as a list. Raises ValueError if a word isn't a card.
+    """
+    return parseNames(text.split())
+
+
+def namesToMask(words):
+    """
+    Like parseNames(), but returns a bitmask. Raises ValueError if a card
+    is given twice.
+    """
+    mask = 0
+    for card in parseNames(words):
+        if mask & cardMasks[card]:
+            raise ValueError("Card given twice: " + names[card])
+        mask |= cardMasks[card]
+    return mask
+
+
+def parseMask(text):
+    """
+    Like parseCards(), but returns a bitmask. Raises ValueError if a card
+    is given twice.
+    """
+    return namesToMask(text.split())
+
+
+def formatCards(cards, sep=" "):
+    """
+    Returns the names of the given cards, in the given order, joined by sep.
+    """
+    return sep.join([names[card] for card in cards])
+
+
+def formatMask(mask, sep=" "):
+    """
+    Returns the names of the cards in a bitmask, in card order, joined by
+    sep.
+    """
+    parts = []
+    k = 0
+    while mask:
+        b = mask & 255
+        if b:
+            parts.extend(chunkNames[k][b])
+        mask >>= 8
+        k += 1
+    return sep.join(parts)
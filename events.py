@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Typed game events shared by both engines (myRussian.py and russian.py).
+
+An engine owns an EventBus. Observers subscribe to it by defining any of
+the handler methods below; the bus keeps one list of handlers per event
+type. The engine checks that list before it builds an event, so event types
+that nobody listens to cost one truth test and nothing else.
+
+    onDeal(event)    DealEvent(seats, hands)
+    onTurn(event)    TurnEvent(seat, hands)
+    onPlay(event)    PlayEvent(seat, rank, count, cards)
+    onCall(event)    CallEvent(seat, isBS, correct)
+    onReveal(event)  RevealEvent(seat, rank, cards)
+    onPickup(event)  PickupEvent(seat, cards)
+    onWin(event)     WinEvent(seats)
+
+Seats are 0-indexed. seats in a DealEvent is the list of player type names
+in seat order, and hands are the cards each seat holds (engine-side view,
+so observers see private information). rank and count in a PlayEvent are
+what was claimed, cards are what was actually played. A RevealEvent is the
+stack top being turned over by a call; seat is whoever played those cards.
+"""
+
+from collections import namedtuple
+
+DealEvent = namedtuple("DealEvent", "seats hands")
+TurnEvent = namedtuple("TurnEvent", "seat hands")
+PlayEvent = namedtuple("PlayEvent", "seat rank count cards")
+CallEvent = namedtuple("CallEvent", "seat isBS correct")
+RevealEvent = namedtuple("RevealEvent", "seat rank cards")
+PickupEvent = namedtuple("PickupEvent", "seat cards")
+WinEvent = namedtuple("WinEvent", "seats")
+
+kinds = ["deal", "turn", "play", "call", "reveal", "pickup", "win"]
+
+
+class EventBus:
+    """
+    Holds the subscribed handlers, one list per event type. Engines test
+    e.g. bus.play before building a PlayEvent and pass the list to emit().
+    """
+
+    def __init__(self, observers=()):
+        for kind in kinds:
+            setattr(self, kind, [])
+        for observer in observers:
+            self.subscribe(observer)
+
+    def subscribe(self, observer):
+        """
+        Registers every on<Kind> method the observer defines.
+        """
+        for kind in kinds:
+            handler = getattr(observer, "on" + kind.capitalize(), None)
+            if handler is not None:
+                getattr(self, kind).append(handler)
+
+    def unsubscribe(self, observer):
+        """
+        Removes every handler belonging to the observer.
+        """
+        for kind in kinds:
+            handlers = getattr(self, kind)
+            handlers[:] = [h for h in handlers
+                           if getattr(h, "__self__", None) is not observer]
+
+    def __nonzero__(self):
+        return any(getattr(self, kind) for kind in kinds)
+
+    __bool__ = __nonzero__
+
+
+def emit(handlers, event):
+    """
+    Hands an event to each handler in turn.
+    """
+    for handler in handlers:
+        handler(event)
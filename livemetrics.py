@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Live metrics for long-running tournaments, served over HTTP in the
+Prometheus text format.
+
+Worker processes count into a SharedCounters block of shared memory. Each
+worker has its own slot (games completed, busy seconds, wins per AI, and a
+histogram of move latencies), so updates are plain stores with no locking
+and no messages. The parent runs a MetricsServer on a background thread
+that sums the slots whenever it is scraped.
+
+Exposed metrics:
+    russianbs_games_completed_total
+    russianbs_games_per_second            (since start, and since last scrape)
+    russianbs_wins_total{ai}
+    russianbs_turn_latency_seconds        (summary: quantiles, sum, count)
+    russianbs_worker_busy_seconds_total{worker}
+    russianbs_worker_utilization{worker}  (busy seconds / seconds running)
+"""
+
+import bisect
+import multiprocessing
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+clock = time.time
+
+"""
+Upper bounds, in seconds, of the move latency histogram buckets. Moves
+slower than the last bound go in an overflow bucket.
+"""
+latencyBuckets = [1e-6 * (10 ** (k / 4.0)) for k in range(29)]
+quantiles = [0.5, 0.9, 0.99]
+
+# Offsets of the fields in a worker's slot.
+GAMES = 0
+BUSY = 1
+LATENCY_SUM = 2
+LATENCY_COUNT = 3
+WINS = 4
+
+
+class SharedCounters:
+    """
+    Counters for numWorkers workers playing games between AIs with the given
+    names, in shared memory. Create it before starting the workers; each
+    worker then writes through its own forWorker() view.
+    """
+
+    def __init__(self, names, numWorkers):
+        self.names = names
+        self.numWorkers = numWorkers
+        self.nameIndex = dict((name, i) for i, name in enumerate(names))
+        self.bucketsAt = WINS + len(names)
+        self.stride = self.bucketsAt + len(latencyBuckets) + 1
+        self.values = multiprocessing.RawArray('d', numWorkers * self.stride)
+        self.started = clock()
+
+    def forWorker(self, worker):
+        """
+        Returns the WorkerCounters that worker number `worker` writes to.
+        """
+        return WorkerCounters(self, worker)
+
+    def totals(self):
+        """
+        Returns the sum over workers of every field, plus each worker's busy
+        seconds.
+        """
+        stride = self.stride
+        values = self.values[:]
+        totals = [sum(values[w * stride + i] for w in range(self.numWorkers))
+                  for i in range(stride)]
+        busy = [values[w * stride + BUSY] for w in range(self.numWorkers)]
+        return totals, busy
+
+
+class WorkerCounters:
+    """
+    One worker's slot of a SharedCounters block.
+    """
+
+    def __init__(self, shared, worker):
+        self.values = shared.values
+        self.nameIndex = shared.nameIndex
+        self.base = worker * shared.stride
+        self.bucketsAt = self.base + shared.bucketsAt
+
+    def observeLatency(self, seconds):
+        """
+        Records how long one move took.
+        """
+        values = self.values
+        values[self.base + LATENCY_SUM] += seconds
+        values[self.base + LATENCY_COUNT] += 1
+        values[self.bucketsAt + bisect.bisect_left(latencyBuckets, seconds)] += 1
+
+    def gameDone(self, winners, seconds):
+        """
+        Records a finished game: the names of its winners and how long it
+        took to play.
+        """
+        values = self.values
+        values[self.base + GAMES] += 1
+        values[self.base + BUSY] += seconds
+        for name in winners:
+            values[self.base + WINS + self.nameIndex[name]] += 1
+
+
+def latencyQuantile(buckets, q):
+    """
+    Estimates quantile q of the move latency from histogram bucket counts,
+    interpolating linearly within the bucket it falls in.
+    """
+    total = sum(buckets)
+    if not total:
+        return float("nan")
+    target = q * total
+    seen = 0.0
+    for i, count in enumerate(buckets):
+        if seen + count >= target and count:
+            if i == len(latencyBuckets):
+                return latencyBuckets[-1]
+            lower = latencyBuckets[i - 1] if i else 0.0
+            return lower + (latencyBuckets[i] - lower) * (target - seen) / count
+        seen += count
+    return latencyBuckets[-1]
+
+
+def render(shared, lastScrape):
+    """
+    Returns the current metrics in Prometheus text format. lastScrape is a
+    two-item list [time, games] from the previous call, updated in place.
+    """
+    now = clock()
+    totals, busy = shared.totals()
+    games = totals[GAMES]
+    elapsed = max(now - shared.started, 1e-9)
+    sinceLast = max(now - lastScrape[0], 1e-9)
+    recentRate = (games - lastScrape[1]) / sinceLast
+    lastScrape[0], lastScrape[1] = now, games
+
+    lines = [
+        "# HELP russianbs_games_completed_total Games finished so far.",
+        "# TYPE russianbs_games_completed_total counter",
+        "russianbs_games_completed_total %d" % games,
+        "# HELP russianbs_games_per_second Game throughput.",
+        "# TYPE russianbs_games_per_second gauge",
+        'russianbs_games_per_second{window="total"} %.6f' % (games / elapsed),
+        'russianbs_games_per_second{window="since_last_scrape"} %.6f' % recentRate,
+        "# HELP russianbs_wins_total Games won by each AI.",
+        "# TYPE russianbs_wins_total counter",
+    ]
+    for i, name in enumerate(shared.names):
+        lines.append('russianbs_wins_total{ai="%s"} %d' % (name, totals[WINS + i]))
+    buckets = totals[shared.bucketsAt:]
+    lines += [
+        "# HELP russianbs_turn_latency_seconds Time taken to choose a move.",
+        "# TYPE russianbs_turn_latency_seconds summary",
+    ]
+    for q in quantiles:
+        lines.append('russianbs_turn_latency_seconds{quantile="%s"} %.9f'
+                     % (q, latencyQuantile(buckets, q)))
+    lines += [
+        "russianbs_turn_latency_seconds_sum %.6f" % totals[LATENCY_SUM],
+        "russianbs_turn_latency_seconds_count %d" % totals[LATENCY_COUNT],
+        "# HELP russianbs_worker_busy_seconds_total Seconds each worker spent playing games.",
+        "# TYPE russianbs_worker_busy_seconds_total counter",
+    ]
+    for w, seconds in enumerate(busy):
+        lines.append('russianbs_worker_busy_seconds_total{worker="%d"} %.6f' % (w, seconds))
+    lines += [
+        "# HELP russianbs_worker_utilization Fraction of the run each worker spent playing games.",
+        "# TYPE russianbs_worker_utilization gauge",
+    ]
+    for w, seconds in enumerate(busy):
+        lines.append('russianbs_worker_utilization{worker="%d"} %.6f' % (w, seconds / elapsed))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Serves a SharedCounters block at http://host:port/metrics from a daemon
+    thread. port 0 picks a free port; the one chosen is in self.port.
+    """
+
+    def __init__(self, shared, port=0, host="127.0.0.1"):
+        lastScrape = [shared.started, 0.0]
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render(shared, lastScrape)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = HTTPServer((host, port), Handler)
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Per-game metrics for Russian BS simulations.
+
+playGame() (myRussian.py) and RussianBS (russian.py) each fill in one
+GameRecord per game. A MetricsTable collects those records into typed columns,
+one array.array per field, so a game costs a few dozen bytes instead of a
+handful of Python dicts and lists.
+
+The summary functions hand the columns to NumPy and do all of their group-bys
+with vectorized operations (bincount, mean over an axis, percentile), which
+is what makes it practical to look at millions of games at once. NumPy is
+only needed for the summaries and for save()/load(); collecting records works
+without it.
+"""
+
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+"""
+Call outcomes are stored as four counters per game, indexed by
+2 * (call was BS) + (call was correct).
+"""
+BELIEVE_WRONG = 0
+BELIEVE_RIGHT = 1
+BS_WRONG = 2
+BS_RIGHT = 3
+callOutcomeNames = ["believeWrong", "believeRight", "bsWrong", "bsRight"]
+
+
+class GameRecord:
+    """
+    Everything we keep about one finished game. The engine creates one of
+    these at the start of a game and bumps its counters as the game goes.
+
+    seats is the list of player type names in seat order, winners is the
+    list of winning seat indices, and pickups/bluffs hold one counter per
+    seat (cards picked up, and plays whose cards didn't match the claim).
+    For timed games, timeUsed holds each seat's thinking time in seconds
+    and flagged whether the seat ran out of time.
+    """
+
+    def __init__(self, seats):
+        self.seats = seats
+        self.turns = 0
+        self.calls = [0, 0, 0, 0]
+        self.pickups = [0] * len(seats)
+        self.bluffs = [0] * len(seats)
+        self.timeUsed = [0.0] * len(seats)
+        self.flagged = [0] * len(seats)
+        self.winners = []
+
+    def recordCall(self, isBS, correct):
+        """
+        Counts one BS/Believe call by its type and outcome.
+        """
+        self.calls[2 * isBS + correct] += 1
+
+
+class MetricsTable:
+    """
+    Columnar store of GameRecords for games with a fixed number of seats.
+
+    Per-seat fields are stored flattened, numSeats values per game, and come
+    back from toArrays() as (numGames, numSeats) arrays. Player type names
+    are stored as small integer codes; typeNames maps a code back to its name.
+    """
+
+    def __init__(self, numSeats):
+        self.numSeats = numSeats
+        self.typeNames = []
+        self.typeCodes = {}
+        self.turns = array.array('i')
+        self.calls = array.array('i')
+        self.pickups = array.array('i')
+        self.bluffs = array.array('i')
+        self.timeUsed = array.array('d')
+        self.flagged = array.array('b')
+        self.seatTypes = array.array('b')
+        self.wins = array.array('b')
+
+    def __len__(self):
+        return len(self.turns)
+
+    def typeCode(self, name):
+        """
+        Returns the integer code for a player type name, assigning a new
+        one the first time a name is seen.
+        """
+        code = self.typeCodes.get(name)
+        if code is None:
+            code = self.typeCodes[name] = len(self.typeNames)
+            self.typeNames.append(name)
+        return code
+
+    def addGame(self, record):
+        """
+        Appends one GameRecord to the table.
+        """
+        if len(record.seats) != self.numSeats:
+            raise ValueError("Expected a game with " + str(self.numSeats) +
+                             " seats, got " + str(len(record.seats)))
+        self.turns.append(record.turns)
+        self.calls.extend(record.calls)
+        self.pickups.extend(record.pickups)
+        self.bluffs.extend(record.bluffs)
+        self.timeUsed.extend(record.timeUsed)
+        self.flagged.extend(record.flagged)
+        self.seatTypes.extend([self.typeCode(name) for name in record.seats])
+        won = [0] * self.numSeats
+        for seat in record.winners:
+            won[seat] = 1
+        self.wins.extend(won)
+
+    def extend(self, other):
+        """
+        Appends every game of another MetricsTable, e.g. one filled in by a
+        worker process, translating its player type codes to ours.
+        """
+        if other.numSeats != self.numSeats:
+            raise ValueError("Can't merge tables with different numbers of seats.")
+        codes = [self.typeCode(name) for name in other.typeNames]
+        self.turns.extend(other.turns)
+        self.calls.extend(other.calls)
+        self.pickups.extend(other.pickups)
+        self.bluffs.extend(other.bluffs)
+        self.timeUsed.extend(other.timeUsed)
+        self.flagged.extend(other.flagged)
+        self.seatTypes.extend([codes[code] for code in other.seatTypes])
+        self.wins.extend(other.wins)
+
+    def toArrays(self):
+        """
+        Returns the table as a dict of NumPy arrays. Per-seat columns have
+        shape (numGames, numSeats) and calls has shape (numGames, 4). The
+        arrays are a snapshot: games added afterwards don't show up in them.
+        """
+        requireNumpy()
+        n = len(self)
+        return {
+            "turns": asArray(self.turns, numpy.intc),
+            "calls": asArray(self.calls, numpy.intc).reshape(n, 4),
+            "pickups": asArray(self.pickups, numpy.intc).reshape(n, self.numSeats),
+            "bluffs": asArray(self.bluffs, numpy.intc).reshape(n, self.numSeats),
+            "timeUsed": asArray(self.timeUsed, numpy.double).reshape(n, self.numSeats),
+            "flagged": asArray(self.flagged, numpy.int8).reshape(n, self.numSeats),
+            "seatTypes": asArray(self.seatTypes, numpy.int8).reshape(n, self.numSeats),
+            "wins": asArray(self.wins, numpy.int8).reshape(n, self.numSeats),
+        }
+
+    def save(self, path):
+        """
+        Writes the table to a compressed .npz file, one array per column.
+        """
+        columns = self.toArrays()
+        numpy.savez_compressed(path, typeNames=numpy.array(self.typeNames),
+                               **columns)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a table written by save().
+        """
+        requireNumpy()
+        data = numpy.load(path)
+        table = cls(data["wins"].shape[1])
+        for name in data["typeNames"]:
+            table.typeCode(str(name))
+        table.turns.extend(data["turns"].astype(numpy.intc).tolist())
+        table.calls.extend(data["calls"].astype(numpy.intc).ravel().tolist())
+        table.pickups.extend(data["pickups"].astype(numpy.intc).ravel().tolist())
+        table.bluffs.extend(data["bluffs"].astype(numpy.intc).ravel().tolist())
+        table.timeUsed.extend(data["timeUsed"].astype(numpy.double).ravel().tolist())
+        table.flagged.extend(data["flagged"].astype(numpy.int8).ravel().tolist())
+        table.seatTypes.extend(data["seatTypes"].astype(numpy.int8).ravel().tolist())
+        table.wins.extend(data["wins"].astype(numpy.int8).ravel().tolist())
+        return table
+
+
+"""
+SUMMARIES--------------------------------------------------------------------//
+Each of these takes the dict returned by MetricsTable.toArrays() (so that the
+conversion is paid once) and does its work with whole-array operations.
+"""
+
+def requireNumpy():
+    """
+    Raises a helpful error if NumPy isn't installed.
+    """
+    if numpy is None:
+        raise ImportError("NumPy is required for metrics summaries.")
+
+
+def asArray(column, dtype):
+    """
+    Copies an array.array column into a NumPy array. The copy is taken
+    straight from the column's buffer. Keeping a frombuffer() view instead
+    isn't safe: Python 2 arrays don't lock exported buffers, so the view
+    would point at freed memory once addGame() grows the column.
+    """
+    if not column:
+        return numpy.zeros(0, dtype=dtype)
+    return numpy.frombuffer(column, dtype=dtype).copy()
+
+
+def winRateBySeat(columns):
+    """
+    Returns an array holding the fraction of games won from each seat.
+    """
+    return columns["wins"].mean(axis=0)
+
+
+def winRateByType(columns, typeNames):
+    """
+    Returns a dict mapping player type name to the fraction of its seats
+    (i.e. games played, counting each seat separately) that won.
+    """
+    types = columns["seatTypes"].ravel()
+    played = numpy.bincount(types, minlength=len(typeNames))
+    won = numpy.bincount(types, weights=columns["wins"].ravel(),
+                         minlength=len(typeNames))
+    return {typeNames[i]: won[i] / played[i] for i in range(len(typeNames))
+            if played[i]}
+
+
+def perTypeMean(columns, typeNames, column):
+    """
+    Returns a dict mapping player type name to the per-game mean of a
+    per-seat column, e.g. "pickups", "bluffs" or "timeUsed".
+    """
+    types = columns["seatTypes"].ravel()
+    played = numpy.bincount(types, minlength=len(typeNames))
+    total = numpy.bincount(types, weights=columns[column].ravel(),
+                           minlength=len(typeNames))
+    return {typeNames[i]: total[i] / played[i] for i in range(len(typeNames))
+            if played[i]}
+
+
+def gameLengthDistribution(columns):
+    """
+    Returns an array whose i-th entry is the number of games that lasted
+    exactly i turns.
+    """
+    return numpy.bincount(columns["turns"])
+
+
+def gameLengthPercentiles(columns, percentiles=(5, 25, 50, 75, 95)):
+    """
+    Returns a dict mapping each requested percentile to a game length.
+    """
+    values = numpy.percentile(columns["turns"], percentiles)
+    return dict(zip(percentiles, values))
+
+
+def callOutcomes(columns):
+    """
+    Returns a dict of total calls by type and outcome.
+    """
+    totals = columns["calls"].sum(axis=0)
+    return dict(zip(callOutcomeNames, totals.tolist()))
+
+
+def summarize(table):
+    """
+    Returns a dict with every summary above for the given MetricsTable.
+    """
+    if not len(table):
+        raise ValueError("No games to summarize.")
+    columns = table.toArrays()
+    return {
+        "games": len(table),
+        "winRateBySeat": winRateBySeat(columns).tolist(),
+        "winRateByType": winRateByType(columns, table.typeNames),
+        "pickupsByType": perTypeMean(columns, table.typeNames, "pickups"),
+        "bluffsByType": perTypeMean(columns, table.typeNames, "bluffs"),
+        "timeUsedByType": perTypeMean(columns, table.typeNames, "timeUsed"),
+        "flaggedByType": perTypeMean(columns, table.typeNames, "flagged"),
+        "gameLengthPercentiles": gameLengthPercentiles(columns),
+        "callOutcomes": callOutcomes(columns),
+    }
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Move and history records shared by both engines (myRussian.py and
+russian.py).
+
+A move is either one of the small integer call codes BELIEVE and BS, or a
+Play. Plays carry a bitmask of the cards actually played (bit c set for card
+c in 0..51), so checking a claim is one AND against the precomputed mask of
+the claimed rank instead of a loop over the cards.
+
+Every entry of a game history is a Record, whatever kind of turn it was,
+so history readers don't have to care about tuple arities.
+"""
+
+from cardcodec import cardsToMask, formatCards, parseNames, rankMasks
+
+"""
+Move kinds. Calls are represented by their kind code directly.
+"""
+BELIEVE = 0
+BS = 1
+PLAY = 2
+
+callNames = {"believe": BELIEVE, "bl": BELIEVE, "bs": BS}
+
+
+class Play(object):
+    """
+    A play of cards. rank and count are what the player claims, cards are
+    the cards actually played and mask is their bitmask. count defaults to
+    the number of cards played.
+    """
+    __slots__ = ("rank", "count", "cards", "mask")
+    kind = PLAY
+
+    def __init__(self, rank, cards, count=None):
+        self.rank = rank
+        self.cards = cards
+        self.count = len(cards) if count is None else count
+        self.mask = cardsToMask(cards)
+
+    def isHonest(self):
+        """
+        Returns True if the cards played are exactly what was claimed.
+        """
+        return self.count == len(self.cards) and not self.mask & ~rankMasks[self.rank]
+
+    def __repr__(self):
+        return "Play(" + repr(self.rank) + ", " + repr(self.cards) + ", " + repr(self.count) + ")"
+
+
+class Record(object):
+    """
+    One turn of public game history.
+
+    kind is PLAY, BELIEVE or BS and seat is the player whose turn it was.
+    For a play, rank and count are the claim. For a call, rank is the rank
+    that was called on, correct says whether the call was right, and cards
+    are the cards revealed (None for plays, since those aren't public).
+    """
+    __slots__ = ("kind", "seat", "rank", "count", "correct", "cards")
+
+    def __init__(self, kind, seat, rank, count, correct=None, cards=None):
+        self.kind = kind
+        self.seat = seat
+        self.rank = rank
+        self.count = count
+        self.correct = correct
+        self.cards = cards
+
+    def __repr__(self):
+        return ("Record(" + ", ".join(repr(getattr(self, name)) for name in self.__slots__) + ")")
+
+
+def isCall(move):
+    """
+    Returns True if the move is a BELIEVE or BS call. The type check keeps
+    True, False and 0.0, which compare equal to the codes, from passing.
+    """
+    return type(move) is int and (move == BELIEVE or move == BS)
+
+
+def isPlay(move):
+    """
+    Returns True if the move is a Play.
+    """
+    return isinstance(move, Play)
+
+
+def isCallCorrect(call, play):
+    """
+    Returns True if calling BELIEVE or BS on the given play is correct.
+    """
+    return (call == BELIEVE) == play.isHonest()
+
+
+def parseMove(text):
+    """
+    Parses a move typed as "bs", "believe" (or "bl"), or a claimed 1-indexed
+    rank followed by the cards actually played, e.g. "5 S5 D12". Plays come
+    back with their cards as a set. Raises ValueError on bad input.
+    """
+    words = text.split()
+    if len(words) == 1 and words[0].lower() in callNames:
+        return callNames[words[0].lower()]
+    if len(words) < 2:
+        raise ValueError("Expected bs, believe, or a rank and some cards.")
+    rank = int(words[0]) - 1
+    if not 0 <= rank < 13:
+        raise ValueError("Not a rank: " + words[0])
+    return Play(rank, set(parseNames(words[1:])))
+
+
+def formatMove(move):
+    """
+    Returns the text form of a move, as accepted by parseMove().
+    """
+    if move == BELIEVE:
+        return "believe"
+    if move == BS:
+        return "bs"
+    return str(move.rank + 1) + " " + formatCards(sorted(move.cards))
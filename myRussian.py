@@ -5,9 +5,22 @@ Created on Tue May 17 19:26:36 2016
 @author: giraffe
 """
 
+import copy
+import itertools
+import math
+import multiprocessing
+import Queue
 import random
+import traceback
 from collections import Counter
 
+import cardcodec
+import events
+import livemetrics
+import metrics
+import timecontrol
+from moves import BELIEVE, BS, PLAY, Play, Record, isCall, isCallCorrect, isPlay, parseMove
+
 """
 Structure of this file:
 global variables
@@ -17,7 +30,9 @@ playGame function (runs one game between two players)
 main function (runs many games between given AI's)
 
 Set verbose to True for debugging help, but definitely not recommended
-when running more than one game at a time.
+when running more than one game at a time. Verbose output is just a
+VerboseObserver subscribed to the game's events.EventBus; pass your own bus
+to playGame() to attach other observers.
 """
 
 verbose = False
@@ -34,10 +49,7 @@ cardNumToName = {n : ranks[n % 13] + " of " + suits[n / 13] for n in deck}
 cardNumToRankName = {n : ranks[n % 13] for n in deck}
 cardNumToSuitName = {n : suits[n / 13] for n in deck}
 
-dcards = ["S1", "S2", "S3", "S4", "S5", "S6", "S7", "S8", "S9", "S10", "S11", "S12", "S13",
-          "C1", "C2", "C3", "C4", "C5", "C6", "C7", "C8", "C9", "C10", "C11", "C12", "C13",
-          "D1", "D2", "D3", "D4", "D5", "D6", "D7", "D8", "D9", "D10", "D11", "D12", "D13",
-          "H1", "H2", "H3", "H4", "H5", "H6", "H7", "H8", "H9", "H10", "H11", "H12", "H13"]
+dcards = cardcodec.names
 
 """
 topOfStack and bottomOfStack are global for convenience. No peeking from within
@@ -49,11 +61,12 @@ bottomOfStack = set()
 
 
 """
-matchHistory will be a list of tuples, one per turn. There will be two types
-of tuples:
-(BS/Believe, callFailure/Success, [list of cards revealed], turn)
-(rankClaimed, numberOfCards, turn)
-Thus, matchHistory will contain all public information.
+matchHistory will be a list of moves.Record, one per turn. Plays record
+the claimed rank and number of cards; BS/Believe calls record whether the
+call succeeded and the cards revealed. Either way the record knows whose
+turn it was. Thus, matchHistory will contain all public information.
+
+Moves themselves are the call codes BELIEVE and BS, or a moves.Play.
 """
 matchHistory = []
 
@@ -73,14 +86,22 @@ class Player:
     a chooseMove(self) function. Note that since the match history is global,
     players don't need to be passed it in order to make a move.
     
-    Each player knows its pid(turn).
+    Each player knows its pid(turn). In timed games, each player is also
+    handed a timecontrol.Deadline before every move; players that search
+    should poll it and return in time.
+    
+    If the game tracks opponents, each player is given the game's
+    opponents.OpponentTracker as self.opponents (None otherwise), so it can
+    look up what previous games taught us about the player in any seat.
     """
     
     def __init__(self):
         """
-        Give self an empty hand.
+        Give self an empty hand and no time limit.
         """
         self.hand = set()
+        self.deadline = timecontrol.Deadline(None)
+        self.opponents = None
     
     def gainCards(self, cards):
         """
@@ -94,12 +115,72 @@ class Player:
         """
         self.turn = turn
     
+    def setDeadline(self, deadline):
+        """
+        Sets the deadline for this player's next move.
+        """
+        self.deadline = deadline
+    
+    def setOpponents(self, tracker):
+        """
+        Gives this player the game's opponents.OpponentTracker.
+        """
+        self.opponents = tracker
+    
+    def getIdentity(self):
+        """
+        Returns the key that opponent models for this player are stored
+        under. Players of the same class share a model unless a derived
+        class says otherwise.
+        """
+        return self.__class__.__name__
+    
     def getHand(self):
         """
         Returns a set-of-integers representation of the player's hand.
         MUST BE OVERRIDDEN IF USING A DIFFERENT INTERNAL REPRESENTATION!
         """
         return self.hand
+    
+    def fallbackMove(self):
+        """
+        Instant move made on this player's behalf once it has run out of
+        time: plays one card honestly on an empty stack, otherwise calls
+        Believe.
+        MUST BE OVERRIDDEN IF USING A DIFFERENT INTERNAL REPRESENTATION!
+        """
+        if isStackEmpty():
+            c = min(self.hand)
+            self.hand -= set([c])
+            return Play(c % 13, set([c]))
+        return BELIEVE
+        
+        
+class AnytimePlayer(Player):
+    """
+    Base class for search-based players that can be stopped at any time.
+    Derived classes supply a searchMoves() generator that yields
+    successively better moves and doesn't touch the hand. chooseMove()
+    keeps the latest move yielded and stops when the search finishes or the
+    deadline expires, so the search uses whatever time is left.
+    """
+    
+    def chooseMove(self):
+        """
+        Runs searchMoves() until it finishes or time runs out, and plays the
+        best move found so far. If the search found nothing, plays
+        fallbackMove() instead.
+        """
+        best = None
+        for move in self.searchMoves():
+            best = move
+            if self.deadline.expired():
+                break
+        if best is None:
+            return self.fallbackMove()
+        if isPlay(best):
+            self.hand -= best.cards
+        return best
         
 """
 DERIVED CLASSES--------------------------------------------------------------//
@@ -123,9 +204,9 @@ class RandomAI1Player(Player):
         if isStackEmpty():
             c = random.choice(list(self.hand))
             self.hand -= set([c])
-            return (c % 13, set([c]))
+            return Play(c % 13, set([c]))
         else:
-            return random.choice(["Believe", "BS"])
+            return random.choice([BELIEVE, BS])
      
 
 class RandomAI2Player(Player):
@@ -146,11 +227,11 @@ class RandomAI2Player(Player):
             c = random.choice(list(self.hand))
             self.hand -= set([c])
             if random.random() > .5:
-                return (c % 13, set([c])) # Tell the truth.
+                return Play(c % 13, set([c])) # Tell the truth.
             else:
-                return (random.choice(list(set(range(0, 13)) - set([c]))), set([c])) # Lie.
+                return Play(random.choice(list(set(range(0, 13)) - set([c]))), set([c])) # Lie.
         else:
-            return random.choice(["Believe", "BS"])
+            return random.choice([BELIEVE, BS])
     
     
 class NaivePlayer(Player):
@@ -173,30 +254,150 @@ class NaivePlayer(Player):
             mostCommonRank = max(set(cardsByRank), key=cardsByRank.count)
             cardsToPlay = set([c for c in self.hand if c % 13 == mostCommonRank])
             self.hand -= cardsToPlay
-            return (mostCommonRank, cardsToPlay)
+            return Play(mostCommonRank, cardsToPlay)
             
         else:
-            prevRank = matchHistory[-1][0]
+            prevRank = matchHistory[-1].rank
             cardsOfPrevRankInHand = set([c for c in self.hand if c % 13 == prevRank])
             if cardsOfPrevRankInHand:
-                return (prevRank, cardsOfPrevRankInHand)
+                self.hand -= cardsOfPrevRankInHand
+                return Play(prevRank, cardsOfPrevRankInHand)
             else:
                 ''' Now we've gotta call bs or believe. We will examine our past
                 bs/believe calls and flip a weighted coin to decide what to do.'''
-                pastBelieveResults = [move[1] for move in matchHistory 
-                        if move[-1] == self.turn and move[0] == "Believe"]
-                pastBSResults = [move[1] for move in matchHistory 
-                        if move[-1] == self.turn and move[0] == "BS"]
+                pastBelieveResults = [move.correct for move in matchHistory 
+                        if move.seat == self.turn and move.kind == BELIEVE]
+                pastBSResults = [move.correct for move in matchHistory 
+                        if move.seat == self.turn and move.kind == BS]
                 if not pastBelieveResults:
                     # Go ahead and explore.
-                    return "Believe"
+                    return BELIEVE
                 elif not pastBSResults:
-                    return "BS"
+                    return BS
                 else:
                     # We have past results. Go with the more promising option.
                     believePercentCorrect = pastBelieveResults.count(True) / len(pastBelieveResults)
                     bsPercentCorrect = pastBSResults.count(True) / len(pastBSResults)
-                    return "Believe" if believePercentCorrect > bsPercentCorrect else "BS"
+                    return BELIEVE if believePercentCorrect > bsPercentCorrect else BS
+
+
+class ParamPlayer(Player):
+    """
+    Class for a player whose strategy is a vector of numbers in [0, 1], so
+    that it can be tuned (see tuner.py) rather than hand-written:
+
+    params[0] lieProb     chance of lying about the rank when leading
+    params[1] leadAll     chance of leading with every card of its most
+                          common rank rather than just one
+    params[2] followProb  chance of following the claimed rank with real
+                          cards when it has some, rather than calling
+    params[3] bsProb      chance of calling BS rather than Believe
+    params[4] modelWeight how much to replace bsProb by the previous
+                          player's bluff rate from past games, if the game
+                          tracks opponents
+
+    Claims that can't be true given its own hand are always called BS.
+    """
+
+    defaults = (0.5, 0.5, 1.0, 0.5, 0.0)
+
+    def __init__(self, params=None):
+        Player.__init__(self)
+        self.params = self.defaults if params is None else tuple(params)
+
+    def getIdentity(self):
+        """
+        Differently tuned ParamPlayers get separate opponent models.
+        """
+        return self.__class__.__name__ + repr(self.params)
+
+    def chooseMove(self):
+        """
+        Leads, follows or calls as described by self.params.
+        """
+        lieProb, leadAll, followProb, bsProb, modelWeight = self.params
+        if isStackEmpty():
+            cardsByRank = [card % 13 for card in self.hand]
+            rank = max(set(cardsByRank), key=cardsByRank.count)
+            if random.random() < leadAll:
+                cardsToPlay = set([c for c in self.hand if c % 13 == rank])
+            else:
+                cardsToPlay = set([random.choice([c for c in self.hand if c % 13 == rank])])
+            self.hand -= cardsToPlay
+            if random.random() < lieProb:
+                rank = random.choice([r for r in range(13) if r != rank])
+            return Play(rank, cardsToPlay)
+
+        last = matchHistory[-1]
+        cardsOfRank = set([c for c in self.hand if c % 13 == last.rank])
+        if cardsOfRank and random.random() < followProb:
+            self.hand -= cardsOfRank
+            return Play(last.rank, cardsOfRank)
+        if last.count + len(cardsOfRank) > 4:
+            return BS
+        if modelWeight and self.opponents is not None:
+            bluffRate = self.opponents.model(last.seat).bluffRate(bsProb)
+            bsProb = (1 - modelWeight) * bsProb + modelWeight * bluffRate
+        return BS if random.random() < bsProb else BELIEVE
+
+
+class SamplingPlayer(AnytimePlayer):
+    """
+    Anytime player that leads and follows honestly like NaivePlayer, and
+    decides calls by sampling where the copies of the claimed rank that it
+    can't see might be. Each batch of samples sharpens its estimate of how
+    likely the last claim is to be a lie, so the more time it has, the
+    better its calls. Untimed, it stops after maxSamples samples.
+    """
+    
+    batchSize = 20
+    maxSamples = 400
+    
+    def searchMoves(self):
+        """
+        Yields the honest lead or follow if there is one. Otherwise yields
+        Believe, then after every batch of samples whichever call the
+        samples so far favour.
+        """
+        if isStackEmpty():
+            cardsByRank = [card % 13 for card in self.hand]
+            rank = max(set(cardsByRank), key=cardsByRank.count)
+            yield Play(rank, set([c for c in self.hand if c % 13 == rank]))
+            return
+        last = matchHistory[-1]
+        cardsOfRank = set([c for c in self.hand if c % 13 == last.rank])
+        if cardsOfRank:
+            yield Play(last.rank, cardsOfRank)
+            return
+        yield BELIEVE
+        
+        # Copies of the rank that went out of the game on a correct Believe.
+        out = sum(1 for move in matchHistory if move.kind == BELIEVE and move.correct
+                  for c in move.cards if c % 13 == last.rank)
+        # Earlier plays this round, all claiming the same rank, and how
+        # likely each was a bluff.
+        earlier = []
+        for move in reversed(matchHistory[:-1]):
+            if move.kind != PLAY:
+                break
+            bluffRate = 0.5
+            if self.opponents is not None:
+                bluffRate = self.opponents.model(move.seat).bluffRate(bluffRate)
+            earlier.append((move.count, bluffRate))
+        others = len(set(move.seat for move in matchHistory if move.seat != self.turn))
+        share = 1.0 / max(1, others)
+        
+        lies = 0
+        for n in xrange(1, self.maxSamples + 1):
+            unseen = 4 - out
+            for count, bluffRate in earlier:
+                if random.random() >= bluffRate:
+                    unseen -= count
+            held = sum(1 for i in range(max(0, unseen)) if random.random() < share)
+            if held < last.count:
+                lies += 1
+            if n % self.batchSize == 0:
+                yield BS if 2 * lies > n else BELIEVE
 
 
 class HumanPlayer(Player):
@@ -213,23 +414,16 @@ class HumanPlayer(Player):
         Where the cards are entered as e.g. "S1 D12 C5 D7"
         """
         moveString = raw_input("Enter a move: ")
-        if moveString.lower() == "believe" or moveString.lower() == "bl":
-            return "Believe"
-        elif moveString.lower() == "bs":
-            return "BS"
-        else:
-            try:
-                # Try to parse as a claimed rank followed by actual cards.
-                claimedRank = int(moveString.split()[0]) - 1
-                actualCards = moveString.split()[1:]
-                actualCards = set([dcards.index(card) for card in actualCards])
-                if not actualCards.issubset(self.hand):
-                    raise Exception()
-                self.hand -= actualCards
-                return (claimedRank, actualCards)
-            except:
-                print "Idiot. You gave me an invalid input. Try again."
-                return self.chooseMove()
+        try:
+            move = parseMove(moveString)
+            if not isCall(move):
+                if not move.cards.issubset(self.hand):
+                    raise ValueError("You don't have those cards.")
+                self.hand -= move.cards
+            return move
+        except ValueError:
+            print "Idiot. You gave me an invalid input. Try again."
+            return self.chooseMove()
 
 """
 HELPER FUNCTIONS for running the game----------------------------------------//
@@ -241,60 +435,64 @@ def isValid(move):
     aren't called on an empty board and the claimed rank is the same
     as the previous claimed rank. Returns True for valid, False for invalid.
     """
-    # This is here to deal with the special case of the first round.
-    if len(matchHistory) != 0:
-        lastMove = matchHistory[-1][0]
-    else:
-        return True if move != "BS" and move != "Believe" else False
-        
-    
-    if move == "BS" or move == "Believe":
-        if lastMove == "BS" or lastMove == "Believe":
-            return False
-    else:
-        if lastMove != "BS" and lastMove != "Believe":
-            if move[0] != lastMove: # If a differing rank was played...
-                return False
-    return True
-        
-
-def isCallCorrect(call, topOfStack):
-    """
-    Checks if a call is correct. Takes either "Believe" or "BS" and returns
-    True if the call is correct and False is the call isn't correct.
-    """
+    # Calls need a play to call on; this also covers the first round.
+    if isCall(move):
+        return bool(matchHistory) and matchHistory[-1].kind == PLAY
+    # Anything else has to be a Play.
+    if not isPlay(move):
+        return False
+    if not matchHistory:
+        return True
     lastMove = matchHistory[-1]
-    for card in topOfStack:
-        if card % 13 != lastMove[0]:
-            # One wrong card indicates an incorrect believe or a correct bs.
-            return False if call == "Believe" else True
-    # All cards were as claimed. Believe is correct, bs is incorrect.
-    return True if call == "Believe" else False
+    # If a differing rank was played on top of a play...
+    return lastMove.kind != PLAY or move.rank == lastMove.rank
 
   
-def printMove(pid, move):
+class VerboseObserver:
     """
-    Prints a player's move to the terminal. Used when verbose is True.
+    Prints a game to the terminal as it happens. playGame() subscribes one
+    of these when verbose is True.
     """
-    if move == "Believe":
-        print "Player " + str(pid) + " called Believe!"
-    elif move == "BS":
-        print "Player " + str(pid) + " called BS!"
-    else:
-        print "Player " + str(pid) + " claims to have played " + str(len(move[1])) + " " + ranks[move[0]] + "\'s."
+    
+    def onDeal(self, event):
+        self.seats = event.seats
+    
+    def onTurn(self, event):
+        print 'Player ' + str((event.seat + 1)) + '\'s hand is:'
+        print [dcards[c] for c in sorted(list(event.hands[event.seat]))]
+    
+    def onPlay(self, event):
+        print "Player " + str(event.seat + 1) + " claims to have played " + str(event.count) + " " + ranks[event.rank] + "\'s."
+    
+    def onCall(self, event):
+        call = "BS" if event.isBS else "Believe"
+        print "Player " + str(event.seat + 1) + " called " + call + "!"
+        if event.correct:
+            print "Correct " + call + " call!"
+        else:
+            print "Incorrect call!"
+    
+    def onWin(self, event):
+        print "Players of the following types won this match:"
+        for seat in event.seats:
+            print self.seats[seat]
+
+
+noObservers = events.EventBus()
         
         
-def getStartingHands(numPlayers):
+def getStartingHands(numPlayers, rng=random):
     """
     Produces a list of numPlayers starting hands. Each element of the list
     is a set representing a hand. The union of all hands is the deck.
+    Shuffles with rng, which can be a seeded random.Random.
     !!!
     This function only works for numPlayers that evenly divides 52 because
     I'm too lazy to make it better.
     !!!
     """
     deck = range(0, 52)
-    random.shuffle(deck)
+    rng.shuffle(deck)
     handSize = 52 / numPlayers
     hands = [set(deck[i*handSize : (i + 1)*handSize]) for i in range(numPlayers)]
     return hands
@@ -311,106 +509,396 @@ playGame()-------------------------------------------------------------------//
 Actually simulates the game.
 """
       
-def playGame(players):
+def playGame(players, table=None, bus=None, timeControl=None, opponents=None,
+             hands=None, onMove=None):
     """
     Plays a game between the provided players. Returns a list of the class 
     names of the winning player(s). 
     Note that in this implementation, a game ends as soon as someone wins.
     "If you aint first, you're last."
+    
+    If a metrics.MetricsTable is given, the game's metrics.GameRecord is
+    added to it when the game ends. If an events.EventBus is given, the
+    game's events are emitted on it.
+    
+    If a timecontrol.TimeControl is given, every move is timed and each
+    seat's time is recorded. Flagged seats play their fallbackMove().
+    
+    If an opponents.OpponentStore is given, this game's events update it and
+    every player gets the game's tracker through setOpponents().
+    
+    hands, if given, is the deal to use instead of a random one (see
+    getStartingHands()). It isn't modified.
+    
+    onMove, if given, is called with the seconds each move took. Moves are
+    only timed if timeControl or onMove is given.
     """
     # Initialize variables for this game.
     global matchHistory, topOfStack, bottomOfStack
     matchHistory = []
-    hands = getStartingHands(len(players))
+    if hands is None:
+        hands = getStartingHands(len(players))
     for i in range(len(players)):
         players[i].gainCards(hands[i])
         players[i].setTurn(i)
+        # Players may come from a timed game; don't let them keep its deadline.
+        players[i].setDeadline(timecontrol.Deadline(None))
+    record = metrics.GameRecord([p.__class__.__name__ for p in players])
+    if bus is None:
+        bus = events.EventBus([VerboseObserver()]) if verbose else noObservers
+    if bus.deal:
+        events.emit(bus.deal, events.DealEvent(record.seats, hands))
+    gameClock = None
+    if timeControl is None and onMove is not None:
+        timeControl = timecontrol.TimeControl()
+    if timeControl is not None:
+        gameClock = timecontrol.GameClock(timeControl, len(players), onMove)
+        record.timeUsed = gameClock.used
+        record.flagged = gameClock.flagged
     
     bottomOfStack = set() # all cards before the most recently played cards
     topOfStack = set() # i.e. the most recently played cards
+    topPlay = None # the moves.Play that put topOfStack there
     turn = 0
     
-    # Keep playing indefinitely. Break only if someone wins.
-    while True:
-        player = players[turn]
+    tracker = None
+    if opponents is not None:
+        tracker = opponents.tracker([p.getIdentity() for p in players])
+        for p in players:
+            p.setOpponents(tracker)
+        if bus is noObservers:
+            bus = events.EventBus()
+        bus.subscribe(tracker)
+    
+    # The tracker must come off the bus even if the game raises, or it would
+    # count every later game played on the same bus twice.
+    try:
+        # Keep playing indefinitely. Break only if someone wins.
+        while True:
+            player = players[turn]
         
-        if verbose:
-            print 'Player ' + str((turn + 1)) + '\'s hand is:'
-            print [dcards[c] for c in sorted(list(player.getHand()))]
+            if bus.turn:
+                events.emit(bus.turn, events.TurnEvent(turn, [p.getHand() for p in players]))
         
-        # Get and check move.
-        move = player.chooseMove()
-        if not isValid(move):
-            raise Exception("We got the following invalid move: " + str(move))
-        if verbose:
-            printMove(players.index(player) + 1, move)
+            # Get and check move.
+            if gameClock is None:
+                move = player.chooseMove()
+            elif gameClock.flagged[turn]:
+                move = player.fallbackMove()
+            else:
+                player.setDeadline(gameClock.startMove(turn))
+                move = player.chooseMove()
+                gameClock.stopMove(turn)
+            if not isValid(move):
+                raise Exception("We got the following invalid move: " + str(move))
+            record.turns += 1
         
-        # Player didn't make a call. Just play their cards and record it.
-        if move != "BS" and move != "Believe":
-            matchHistory.append((move[0], len(move[1]), turn))
-            bottomOfStack |= topOfStack
-            topOfStack = move[1] # Cards are added to top of stack.
+            # Player didn't make a call. Just play their cards and record it.
+            if not isCall(move):
+                matchHistory.append(Record(PLAY, turn, move.rank, move.count))
+                if not move.isHonest():
+                    record.bluffs[turn] += 1
+                bottomOfStack |= topOfStack
+                topOfStack = move.cards # Cards are added to top of stack.
+                topPlay = move
+                if bus.play:
+                    events.emit(bus.play, events.PlayEvent(turn, move.rank, move.count, move.cards))
             
-        else: # Player made a call.
-            if isCallCorrect(move, topOfStack):
-                if move == "Believe":
-                    # Record move, clear stack, and give player an extra turn.
-                    if verbose:
-                        print "Correct Believe call!"
-                    matchHistory.append((move, True, topOfStack, turn))
+            else: # Player made a call.
+                correct = isCallCorrect(move, topPlay)
+                record.recordCall(move == BS, correct)
+                matchHistory.append(Record(move, turn, topPlay.rank, topPlay.count, correct, topOfStack))
+                if bus.call:
+                    events.emit(bus.call, events.CallEvent(turn, move == BS, correct))
+                if bus.reveal:
+                    events.emit(bus.reveal, events.RevealEvent((turn - 1) % len(players), topPlay.rank, topOfStack))
+                if correct:
+                    if move == BELIEVE:
+                        # Clear stack, and give player an extra turn.
+                        bottomOfStack = set()
+                        topOfStack = set()
+                        turn -= 1
+                    else:
+                        # Give stack to last player, and give extra turn.
+                        prevTurn = (turn - 1) % len(players)
+                        prevPlayer = players[prevTurn]
+                        prevPlayer.gainCards(bottomOfStack)
+                        prevPlayer.gainCards(topOfStack)
+                        record.pickups[prevTurn] += len(bottomOfStack) + len(topOfStack)
+                        if bus.pickup:
+                            events.emit(bus.pickup, events.PickupEvent(prevTurn, bottomOfStack | topOfStack))
+                        bottomOfStack = set()
+                        topOfStack = set()
+                        turn -= 1
+                else: # Call wasn't correct.
+                    player.gainCards(bottomOfStack)
+                    player.gainCards(topOfStack)
+                    record.pickups[turn] += len(bottomOfStack) + len(topOfStack)
+                    if bus.pickup:
+                        events.emit(bus.pickup, events.PickupEvent(turn, bottomOfStack | topOfStack))
                     bottomOfStack = set()
                     topOfStack = set()
-                    turn -= 1
-                elif move == "BS":
-                    # Record move, give stack to last player, and give extra turn.
-                    if verbose:
-                        print "Correct BS call!"
-                    matchHistory.append((move, True, topOfStack, turn))
-                    prevPlayer = players[(turn - 1) % len(players)]
-                    prevPlayer.gainCards(bottomOfStack)
-                    prevPlayer.gainCards(topOfStack)
-                    bottomOfStack = set()
-                    topOfStack = set()
-                    turn -= 1
-            else: # Call wasn't correct.
-                if verbose:
-                    print "Incorrect call!"
-                matchHistory.append((move, False, topOfStack))
-                player.gainCards(bottomOfStack)
-                player.gainCards(topOfStack)
-                bottomOfStack = set()
-                topOfStack = set()
             
             
-            ''' We always check for a winner after a BS/Believe call, as this
-            is the only time someone can win. '''
-            winners = [p.__class__.__name__ for p in players if not p.getHand()]
-            if winners:
-                if verbose:
-                    print "Players of the following types won this match:"
-                    for winner in winners:
-                        print winner
-                    
-                return winners
+                ''' We always check for a winner after a BS/Believe call, as this
+                is the only time someone can win. '''
+                winners = [p.__class__.__name__ for p in players if not p.getHand()]
+                if winners:
+                    record.winners = [i for i in range(len(players))
+                                      if not players[i].getHand()]
+                    if bus.win:
+                        events.emit(bus.win, events.WinEvent(record.winners))
+                    if table is not None:
+                        table.addGame(record)
+                    return winners
         
-        # Done processing move; update whose turn it is.        
-        turn = (turn + 1) % len(players)
+            # Done processing move; update whose turn it is.        
+            turn = (turn + 1) % len(players)
+    finally:
+        if tracker is not None:
+            bus.unsubscribe(tracker)
     
     
     
-if __name__ == '__main__':
-    num_matches = 1000
+"""
+playTournament()-------------------------------------------------------------//
+Plays many games between the given AI's.
+"""
+
+def playTournament(playerTypes, numMatches, table=None, timeControl=None,
+                   timeLimit=None, opponents=None):
+    """
+    Plays numMatches games between fresh instances of the given Player
+    classes, shuffling the seats every game. Returns the list of class names
+    of every game's winner(s).
+    
+    timeControl and opponents are passed to each playGame(). If timeLimit (in seconds) is
+    given, no new game is started once that much wall-clock time has passed.
+    """
+    stopAt = None if timeLimit is None else timecontrol.clock() + timeLimit
     winners = []
-    for i in range(num_matches):
-        p1 = RandomAI1Player()
-        p2 = RandomAI2Player()
-        p3 = RandomAI2Player()
-        p4 = NaivePlayer()
-        players = [p1, p2, p3, p4]
+    for i in range(numMatches):
+        if stopAt is not None and timecontrol.clock() >= stopAt:
+            break
+        players = [playerType() for playerType in playerTypes]
         random.shuffle(players)
-        winners += playGame(players)
-    print "We played " + str(num_matches) + " matches. Here's each AI's win count:"
+        winners += playGame(players, table, timeControl=timeControl,
+                            opponents=opponents)
+    return winners
+
+
+def tournamentWorker(playerTypes, numMatches, seed, counters, queue,
+                     wantTable, timeControl, stopAt):
+    """
+    Body of one playParallelTournament() worker process. Plays its share of
+    the games, counting into counters as it goes and starting no new game
+    once the clock passes stopAt (if not None). Then puts (winners, table,
+    None) on the queue, or (None, None, traceback) if anything raised, so
+    the parent never waits on a worker that has died.
+    """
+    try:
+        random.seed(seed)
+        table = metrics.MetricsTable(len(playerTypes)) if wantTable else None
+        winners = []
+        for i in range(numMatches):
+            started = timecontrol.clock()
+            if stopAt is not None and started >= stopAt:
+                break
+            players = [playerType() for playerType in playerTypes]
+            random.shuffle(players)
+            gameWinners = playGame(players, table, timeControl=timeControl,
+                                   onMove=counters.observeLatency)
+            counters.gameDone(gameWinners, timecontrol.clock() - started)
+            winners += gameWinners
+    except Exception:
+        queue.put((None, None, traceback.format_exc()))
+    else:
+        queue.put((winners, table, None))
+
+
+def playParallelTournament(playerTypes, numMatches, numWorkers=None, table=None,
+                           timeControl=None, timeLimit=None, port=None, seed=None):
+    """
+    Like playTournament(), but splits the games across numWorkers processes
+    (one per core by default). Returns the list of class names of every
+    game's winner(s), and adds every game to table if one is given. If
+    timeLimit (in seconds) is given, no worker starts a new game once that
+    much wall-clock time has passed. If a worker raises or dies, so does
+    this, with the worker's traceback.
+    
+    There is no opponents store: each worker would learn into its own copy,
+    and the copies couldn't be merged back into one store.
+    
+    Live metrics are counted in shared memory while the games run. If port
+    is given, they are served in Prometheus text format at
+    http://127.0.0.1:port/metrics for as long as the tournament runs (port
+    0 picks a free port and prints it).
+    """
+    if numWorkers is None:
+        numWorkers = multiprocessing.cpu_count()
+    names = sorted(set(t.__name__ for t in playerTypes))
+    shared = livemetrics.SharedCounters(names, numWorkers)
+    server = None
+    if port is not None:
+        server = livemetrics.MetricsServer(shared, port).start()
+        print "Serving live metrics at http://127.0.0.1:" + str(server.port) + "/metrics"
+    
+    stopAt = None if timeLimit is None else timecontrol.clock() + timeLimit
+    rng = random.Random(seed)
+    queue = multiprocessing.Queue()
+    workers = []
+    for w in range(numWorkers):
+        share = numMatches / numWorkers + (1 if w < numMatches % numWorkers else 0)
+        worker = multiprocessing.Process(target=tournamentWorker,
+            args=(playerTypes, share, rng.getrandbits(32), shared.forWorker(w),
+                  queue, table is not None, timeControl, stopAt))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+    
+    winners = []
+    try:
+        # Drain the queue before joining, or big results can block the workers.
+        # Wait with a timeout so a worker killed before it could report (e.g.
+        # by a signal) is noticed instead of waited on forever.
+        received = 0
+        while received < numWorkers:
+            try:
+                workerWinners, workerTable, error = queue.get(timeout=1.0)
+            except Queue.Empty:
+                for worker in workers:
+                    if worker.exitcode:
+                        raise RuntimeError("Tournament worker exited with code " +
+                                           str(worker.exitcode))
+                continue
+            if error is not None:
+                raise RuntimeError("Tournament worker failed:\n" + error)
+            received += 1
+            winners += workerWinners
+            if table is not None:
+                table.extend(workerTable)
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        if server is not None:
+            server.stop()
+    return winners
+
+
+class DuplicateResult:
+    """
+    Results of playDuplicateTournament(). names[i] labels the i-th competing
+    AI, and scores[d][i] is the fraction of deal d's replays that it won.
+    """
+    
+    def __init__(self, names):
+        self.names = names
+        self.scores = []
+    
+    def meanScores(self):
+        """
+        Returns a dict mapping each AI to its mean score over all deals.
+        """
+        n = len(self.scores)
+        return {name: sum(deal[i] for deal in self.scores) / n
+                for i, name in enumerate(self.names)}
+    
+    def pairedDifferences(self):
+        """
+        Returns a dict mapping each pair of AI names (a, b) to the mean and
+        standard error of a's score minus b's, paired deal by deal. Pairing
+        cancels out how lucky each deal was, which is where most of the
+        variance of independent deals comes from.
+        """
+        n = len(self.scores)
+        result = {}
+        for i, j in itertools.combinations(range(len(self.names)), 2):
+            diffs = [deal[i] - deal[j] for deal in self.scores]
+            mean = sum(diffs) / n
+            if n > 1:
+                variance = sum((d - mean) ** 2 for d in diffs) / (n - 1)
+                stderr = math.sqrt(variance / n)
+            else:
+                stderr = float("nan")
+            result[(self.names[i], self.names[j])] = (mean, stderr)
+        return result
+
+
+def playDuplicateTournament(playerTypes, numDeals, seed=None, permutations=False,
+                            table=None, timeControl=None, opponents=None):
+    """
+    Plays duplicate games: each of numDeals random deals is replayed once
+    per seating of the given Player classes, every rotation of them or, if
+    permutations is True, every ordering. All replays of a deal also start
+    from the same random state (common random numbers), so the AIs differ
+    only in how they play. Returns a DuplicateResult.
+    
+    Rotations keep every AI next to the same neighbours, and in this game it
+    matters who calls on your plays; use permutations to average that out
+    too, at the cost of n! rather than n replays per deal.
+    
+    seed makes the whole tournament reproducible. The global random state
+    is restored afterwards. table and timeControl are passed to each
+    playGame(). If an opponents store is given, every replay of a deal
+    starts from a copy of it as it was when the deal began, so what one
+    replay learns can't change how the next one is played; the store itself
+    learns from the first seating's replay only.
+    """
+    if numDeals < 1:
+        raise ValueError("numDeals must be at least 1, got " + str(numDeals))
+    numPlayers = len(playerTypes)
+    counts = Counter(t.__name__ for t in playerTypes)
+    seen = Counter()
+    names = []
+    for t in playerTypes:
+        seen[t.__name__] += 1
+        names.append(t.__name__ if counts[t.__name__] == 1
+                     else t.__name__ + "#" + str(seen[t.__name__]))
+    if permutations:
+        seatings = list(itertools.permutations(range(numPlayers)))
+    else:
+        seatings = [tuple((i + r) % numPlayers for i in range(numPlayers))
+                    for r in range(numPlayers)]
+    
+    result = DuplicateResult(names)
+    rng = random.Random(seed)
+    savedState = random.getstate()
+    try:
+        for d in range(numDeals):
+            hands = getStartingHands(numPlayers, rng)
+            playSeed = rng.getrandbits(32)
+            wins = [0] * numPlayers
+            snapshot = copy.deepcopy(opponents) if opponents is not None else None
+            for k, seating in enumerate(seatings):
+                # seating[s] is the index of the AI sitting in seat s.
+                random.seed(playSeed)
+                players = [playerTypes[i]() for i in seating]
+                store = opponents if k == 0 else copy.deepcopy(snapshot)
+                playGame(players, table, timeControl=timeControl,
+                         opponents=store, hands=hands)
+                for s in range(numPlayers):
+                    if not players[s].getHand():
+                        wins[seating[s]] += 1
+            result.scores.append([float(w) / len(seatings) for w in wins])
+    finally:
+        random.setstate(savedState)
+    return result
+    
+    
+if __name__ == '__main__':
+    num_matches = 1000
+    time_limit = 60
+    table = metrics.MetricsTable(4)
+    winners = playParallelTournament([RandomAI1Player, RandomAI2Player, RandomAI2Player, NaivePlayer],
+                                     num_matches, table=table, timeLimit=time_limit, port=0)
+    print "We played " + str(len(table)) + " matches. Here's each AI's win count:"
     print dict(Counter(winners))
+    if metrics.numpy is not None:
+        print "Summary of per-game metrics:"
+        print metrics.summarize(table)
     
 
 
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Opponent models that outlive a single game.
+
+An OpponentStore maps an opponent's identity (by default its class name,
+see Player.getIdentity() in myRussian.py) to an OpponentModel of running
+counters: how often its revealed plays were bluffs, how it calls, and how
+many cards it claims. Every query is a couple of divisions on those
+counters, so AIs can ask as often as they like.
+
+During a game an OpponentTracker, made by store.tracker(), sits on the
+game's events.EventBus and updates the models as events arrive. It also
+knows which identity sits in which seat, so AIs can look models up by seat.
+
+The store is bounded: once it holds maxModels models, the least recently
+used one is evicted. save() and load() persist it with pickle.
+"""
+
+import cPickle
+import os
+from collections import OrderedDict
+
+from cardcodec import cardsToMask, rankMasks
+
+
+class OpponentModel:
+    """
+    Running counters for one opponent. claimSizes[n] is the number of plays
+    in which it claimed n cards.
+    """
+
+    def __init__(self):
+        self.plays = 0
+        self.revealed = 0
+        self.bluffs = 0
+        self.believes = 0
+        self.believesRight = 0
+        self.bss = 0
+        self.bssRight = 0
+        self.claimSizes = [0] * 5
+
+    def recordClaim(self, count):
+        self.plays += 1
+        if count >= len(self.claimSizes):
+            self.claimSizes.extend([0] * (count + 1 - len(self.claimSizes)))
+        self.claimSizes[count] += 1
+
+    def recordReveal(self, honest):
+        self.revealed += 1
+        if not honest:
+            self.bluffs += 1
+
+    def recordCall(self, isBS, correct):
+        if isBS:
+            self.bss += 1
+            self.bssRight += correct
+        else:
+            self.believes += 1
+            self.believesRight += correct
+
+    def bluffRate(self, prior=0.5):
+        """
+        Fraction of this opponent's revealed plays that were bluffs, or
+        prior if none have been revealed yet.
+        """
+        return float(self.bluffs) / self.revealed if self.revealed else prior
+
+    def bsRate(self, prior=0.5):
+        """
+        Fraction of this opponent's calls that were BS, or prior if it
+        hasn't called yet.
+        """
+        calls = self.bss + self.believes
+        return float(self.bss) / calls if calls else prior
+
+    def callAccuracy(self, prior=0.5):
+        """
+        Fraction of this opponent's calls that were correct, or prior if it
+        hasn't called yet.
+        """
+        calls = self.bss + self.believes
+        return float(self.bssRight + self.believesRight) / calls if calls else prior
+
+    def claimSizeDistribution(self):
+        """
+        Returns a list whose n-th entry is the fraction of this opponent's
+        plays that claimed n cards.
+        """
+        if not self.plays:
+            return [0.0] * len(self.claimSizes)
+        return [float(n) / self.plays for n in self.claimSizes]
+
+
+class OpponentStore:
+    """
+    LRU-bounded mapping from opponent identity to OpponentModel.
+    """
+
+    def __init__(self, maxModels=1000):
+        self.maxModels = maxModels
+        self.models = OrderedDict()
+
+    def __len__(self):
+        return len(self.models)
+
+    def get(self, key):
+        """
+        Returns the model for key, or None if we know nothing about it.
+        """
+        model = self.models.pop(key, None)
+        if model is not None:
+            self.models[key] = model
+        return model
+
+    def model(self, key):
+        """
+        Returns the model for key, creating it (and evicting the least
+        recently used model if the store is full) if needed.
+        """
+        model = self.models.pop(key, None)
+        if model is None:
+            model = OpponentModel()
+            while self.models and len(self.models) >= self.maxModels:
+                self.models.popitem(last=False)
+        self.models[key] = model
+        return model
+
+    def tracker(self, keys):
+        """
+        Returns an OpponentTracker for a game whose seats hold the given
+        identities.
+        """
+        return OpponentTracker(self, keys)
+
+    def save(self, path):
+        """
+        Pickles the store to path. Writes to a temporary file first so an
+        interrupted save doesn't lose the old one.
+        """
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            cPickle.dump((self.maxModels, list(self.models.items())), f,
+                         cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, path)
+
+    @classmethod
+    def load(cls, path, maxModels=None):
+        """
+        Reads a store written by save(). maxModels overrides the saved bound.
+        """
+        with open(path, "rb") as f:
+            savedMax, items = cPickle.load(f)
+        store = cls(savedMax if maxModels is None else maxModels)
+        # items[-0:] would be every item, not none of them.
+        if store.maxModels > 0:
+            for key, model in items[-store.maxModels:]:
+                store.models[key] = model
+        return store
+
+
+class OpponentTracker:
+    """
+    Observer that feeds one game's events into an OpponentStore. keys[seat]
+    is the identity of the player in that seat.
+    """
+
+    def __init__(self, store, keys):
+        self.store = store
+        self.keys = keys
+        self.lastClaim = 0
+
+    def model(self, seat):
+        """
+        Returns the model for whoever sits in the given seat.
+        """
+        return self.store.model(self.keys[seat])
+
+    def onPlay(self, event):
+        self.lastClaim = event.count
+        self.model(event.seat).recordClaim(event.count)
+
+    def onCall(self, event):
+        self.model(event.seat).recordCall(event.isBS, event.correct)
+
+    def onReveal(self, event):
+        honest = (len(event.cards) == self.lastClaim and
+                  not cardsToMask(event.cards) & ~rankMasks[event.rank])
+        self.model(event.seat).recordReveal(honest)
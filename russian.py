@@ -8,42 +8,24 @@ opponent.
 import sys
 import random
 
-# Define some useful constants.
-BELIEVE = 0
-BS = 1
+import cardcodec
+import events
+import metrics
+from moves import BELIEVE, BS, Play, isCall
 
 # Global list of ranks.
 ranks = ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
-# Global list of aliases for cards.
-dcards = ["S1", "S2", "S3", "S4", "S5", "S6", "S7", "S8", "S9", "S10", "S11", "S12", "S13",
-          "C1", "C2", "C3", "C4", "C5", "C6", "C7", "C8", "C9", "C10", "C11", "C12", "C13",
-          "D1", "D2", "D3", "D4", "D5", "D6", "D7", "D8", "D9", "D10", "D11", "D12", "D13",
-          "H1", "H2", "H3", "H4", "H5", "H6", "H7", "H8", "H9", "H10", "H11", "H12", "H13",]
-cstr = [str(i) for i in range(1, 53)]
-
-# Make a dictionary of cards. We associate each card in the standard deck with
-# an integer in [0, 51] according to the following mapping:
+# Global list of aliases for cards. We associate each card in the standard
+# deck with an integer in [0, 51] according to the following mapping:
 # 0 - 12: Ace - King of spades
 # 13 - 25: Ace - King of clubs
 # 26 - 38: Ace - King of diamonds
 # 39 - 51: Ace - King of hearts
-# In this mapping, the residue mod 13 gives the rank of the card (with jack as
-# 11, queen as 12, king as 13), and the integer division by 13 gives the suit
-# (0 is spades, 1 is clubs, 2 is diamonds, and 3 is hearts). Furthermore, the
-# bottom "half" consists of black cards, whereas the top "half" consists of
-# black cards.
-def makeCards():
-	carddict = dict()
-	for i in range(13):
-		key1 = "S" + str(i)
-		key2 = "C" + str(i)
-		key3 = "D" + str(i)
-		key4 = "H" + str(i)
-		carddict[key1] = i
-		carddict[key2] = i + 13
-		carddict[key3] = i + 26
-		carddict[key4] = i + 39
-	return carddict
+# so that dcards[i] is the alias of card i, e.g. "S1" for the ace of spades.
+# Translating between aliases and integers goes through the shared tables in
+# cardcodec.
+dcards = cardcodec.names
+cstr = [str(i) for i in range(1, 53)]
 
 # PLAYER CLASS---------------------------------------------------------------//
 
@@ -53,17 +35,16 @@ class Player:
 	# Member variables:
 	#    pid        -> the player ID as assigned by the game.
 	#    isAI       -> flag determining whether player is AI or not.
-	#    carddict   -> a dictionary for translating cards.
 	#    state      -> dictionary holding state of game of other players
 	#    game_state -> holds the state of the current round
 	#    game_hist  -> holds the entire history of the game so far.
 	#    nplayers   -> number of players
+	#    opponents  -> the game's opponents.OpponentTracker (or None)
 
 	# Takes a list of cards and a flag for whether the player is AI or not.
 	def __init__(self, PID, pcards, AI, nplayers):
 		self.pid = PID
 		self.AI = AI
-		self.carddict = makeCards()
 		# Holds the knowledge of all players' cards.
 		self.state = dict()
 		for i in range(nplayers):
@@ -73,6 +54,7 @@ class Player:
 		self.game_state = []
 		self.game_hist = []
 		self.nplayers = nplayers
+		self.opponents = None
 
 	# AI FUNCTIONS-----------------------------------------------------------\\
 	# TODO: Eventually change this to a class-inheritance style system.
@@ -90,7 +72,7 @@ class Player:
 			rank = card % 13
 			# Remove the card from our hand.
 			self.removeCards(self.pid, l)
-			return (rank, 1, card)
+			return Play(rank, l)
 		else:
 			# Return BELIEVE or BS uniformly at random.
 			return random.randint(0, 1)
@@ -122,20 +104,16 @@ class Player:
 	# Add cards in the numeric format.
 	def addCards(self, pid, cards, cdict = False):
 		if cdict:
-			for card in cards:
-				self.state[pid].append(self.carddict[card])
+			self.state[pid] += cardcodec.parseNames(cards)
 		else:
 			self.state[pid] += cards
 
 	def removeCards(self, pid, cards, cdict = False):
 		if cdict:
-			for card in cards:
-				if self.carddict[card] in self.state[pid]:
-					self.state[pid].remove(self.carddict[card])
-		else:
-			for card in cards:
-				if card in self.state[pid]:
-					self.state[pid].remove(card)
+			cards = cardcodec.parseNames(cards)
+		for card in cards:
+			if card in self.state[pid]:
+				self.state[pid].remove(card)
 
 	# Get the game state.
 	def getGameState(self, state):
@@ -146,6 +124,11 @@ class Player:
 	def getGameHistory(self, hist):
 		self.game_hist.append(hist)
 
+	# Get the game's opponents.OpponentTracker, which models every seat from
+	# what it has played and called in this and earlier games.
+	def setOpponents(self, tracker):
+		self.opponents = tracker
+
 	# MOVE FUNCTIONS AND HELPERS---------------------------------------------\\
 
 	def prompt(self, rank):
@@ -163,10 +146,10 @@ class Player:
 			# Remove the cards we're playing.
 			self.removeCards(self.pid, self.translate(actual))
 			# Input should be 1-indexed rank.
-			return (rank, int(dnum), self.translate(actual))
+			return Play(rank, self.translate(actual), int(dnum))
 		elif is_card.strip() == "NO":
 			action = raw_input("Action>> ")
-			while action.strip() != BELIEVE and action.strip() != BS:
+			while action.strip() != "BELIEVE" and action.strip() != "BS":
 				print "Enter BELIEVE or BS"
 				action = raw_input("Action>> ")
 			if action.strip() == "BELIEVE":
@@ -174,10 +157,8 @@ class Player:
 			else:
 				return BS
 
-	# Moves which are not "believe" or "BS" should be formatted as follows:
-	# ([rank] [# of cards] [list of actual cards])
-	# i.e. a 3-tuple of which the first element is the rank, second element is
-	# the number of cards played, and the third is list of the actual card.
+	# Moves which are not BELIEVE or BS are a moves.Play holding the declared
+	# rank, the list of actual cards, and the declared number of cards.
 	def playMove(self, first = False, rank = None):
 		if first:
 			if self.AI:
@@ -197,7 +178,7 @@ class Player:
 				# Remove the cards we've played.
 				self.removeCards(self.pid, self.translate(actual))
 				# Input should be 1-indexed rank.
-				move = (self.convertRank(drank), int(dnum), self.translate(actual))
+				move = Play(self.convertRank(drank), self.translate(actual), int(dnum))
 		else:
 			if not self.AI and rank != None:
 				self.printCards()
@@ -215,49 +196,41 @@ class Player:
 	# Checks to see whether the actual move is a playable move, i.e. a subset
 	# of the player's current cards. Looks at cards from the command line.
 	def isSubset(self, cardlist):
-		# Copy our list so we don't have to deal with aliasing issues.
-		cards = [i for i in self.getCards()]
-		for card in cardlist:
-			if card in self.carddict.keys():
-				card = self.carddict[card]
-				if card in cards:
-					cards.remove(card)
-				else:
-					return False
-			else:
-				return False
-		return True
+		try:
+			# namesToMask() also rejects a card given twice.
+			mask = cardcodec.namesToMask(cardlist)
+		except ValueError:
+			return False
+		return not mask & ~cardcodec.cardsToMask(self.getCards())
 
 	# Converts a list of cards from external format to internal format.
 	def convert(self, cardlist):
-		converted = []
-		for card in cardlist:
-			converted.append(self.carddict[card])
-		return converted
+		return cardcodec.parseNames(cardlist)
 
 	# Parses an entered list of cards into internal format.
 	def translate(self, movestr):
-		temp = movestr.strip().split()
-		cards = [self.carddict[i] for i in temp]
-		return cards
+		return cardcodec.parseCards(movestr)
 
 	# Prints the cards in external format.
 	def printCards(self):
-		cards = self.getCards()
 		print "Player %d's cards: " % self.pid
-		for card in cards:
-			name = ""
-			suit = card / 13
-			rank = (card % 13) + 1
-			if suit == 0:
-				name = "S" + str(rank)
-			elif suit == 1:
-				name = "C" + str(rank)
-			elif suit == 2:
-				name = "D" + str(rank)
-			else:
-				name = "H" + str(rank)
-			print "%s" % name
+		print cardcodec.formatCards(self.getCards(), "\n")
+
+# CONSOLE OBSERVER-----------------------------------------------------------//
+
+class ConsoleObserver:
+	'''Prints the progress of a game to the terminal.'''
+
+	def onTurn(self, event):
+		for pid in range(len(event.hands)):
+			print "Player %d has %d cards." % (pid, len(event.hands[pid]))
+		print "Player %d's turn." % event.seat
+
+	def onPlay(self, event):
+		print "Player %d has played %d cards of rank %s" % (event.seat, event.count, ranks[event.rank])
+
+	def onWin(self, event):
+		print "Player %d has won!" % event.seats[0]
 
 # RUSSIANBS CLASS------------------------------------------------------------//
 
@@ -271,9 +244,15 @@ class RussianBS:
 	# round       -> Holds the state of the current round.
 	# won         -> Integer holding who won the game (or -1)
 	# turn        -> The PID of the player whose turn it is
-
-	# AI is expected to be a list of booleans of length num_players
-	def __init__(self, num_players, AI):
+	# table       -> metrics.MetricsTable to add this game's record to (or None)
+	# record      -> metrics.GameRecord for this game
+	# bus         -> events.EventBus that the game's events are emitted on
+	# tracker     -> opponents.OpponentTracker subscribed to bus (or None)
+
+	# AI is expected to be a list of booleans of length num_players. If
+	# opponents (an opponents.OpponentStore) is given, every player gets a
+	# tracker for this game that learns from it and updates the store.
+	def __init__(self, num_players, AI, table = None, bus = None, opponents = None):
 		self.nplayers = num_players
 		self.player_list = range(num_players)
 		# Randomly deal cards to each player.
@@ -298,17 +277,39 @@ class RussianBS:
 		self.round = []
 		self.won = -1
 		self.turn = 0
+		self.table = table
+		self.record = metrics.GameRecord(["AI" if isAI else "Human" for isAI in AI])
+		if bus is None:
+			bus = events.EventBus()
+		self.bus = bus
+		self.tracker = None
+		if opponents is not None:
+			self.tracker = opponents.tracker(self.record.seats)
+			for player in self.player_list:
+				player.setOpponents(self.tracker)
+			bus.subscribe(self.tracker)
+		if bus.deal:
+			events.emit(bus.deal, events.DealEvent(self.record.seats,
+				[player.getCards() for player in self.player_list]))
 
 	# Runs the game.
 	def runGame(self):
-		while self.won == -1:
-			self.updateRound()
-		print "Player %d has won!" % self.won
-
-	# Runs each round of the game. Moves are kept as a tuple of
-	# the list of cards declared, and the list of cards played.
-	# self.round keeps the PID of the player that made the move followed by
-	# the actual move.
+		# Take the tracker off the bus however the game ends, so a bus the
+		# caller reuses doesn't feed it later games.
+		try:
+			while self.won == -1:
+				self.updateRound()
+		finally:
+			if self.tracker is not None:
+				self.bus.unsubscribe(self.tracker)
+		self.record.winners = [self.won]
+		if self.bus.win:
+			events.emit(self.bus.win, events.WinEvent(self.record.winners))
+		if self.table is not None:
+			self.table.addGame(self.record)
+
+	# Runs each round of the game. self.round keeps a (PID, play) pair for
+	# every moves.Play made this round.
 	#
 	# All cards here should be in their internal representation (i.e., in
 	# range(52)).
@@ -319,22 +320,32 @@ class RussianBS:
 		rank = None
 		total_cards = 0
 		while not ended:
-			for player in self.player_list:
-				print "Player %d has %d cards." % (player.getPID(), len(player.getCards()))
-			print "Player %d's turn." % self.turn
+			if self.bus.turn:
+				events.emit(self.bus.turn, events.TurnEvent(self.turn,
+					[player.getCards() for player in self.player_list]))
 			# We already check for valid moves in playerMove() member function.
 			move = self.player_list[self.turn].playMove(first = first, rank = rank)
+			self.record.turns += 1
 			first = False
 			if rank == None:
-				rank = move[0] # The rank is held in the first coordinate.
-			if (move == BELIEVE or move == BS) and self.round != []:
+				rank = move.rank
+			if isCall(move) and self.round != []:
+				(last_pid, last) = self.round[-1]
+				honest = last.isHonest()
+				# BS is right exactly when the last player lied.
+				right = (move == BS) != honest
+				self.record.recordCall(move == BS, right)
+				if self.bus.call:
+					events.emit(self.bus.call, events.CallEvent(self.turn, move == BS, right))
+				if self.bus.reveal:
+					events.emit(self.bus.reveal, events.RevealEvent(last_pid, last.rank, last.cards))
 				# The last player didn't lie.
-				if self.isEqual(self.round[-1]):
+				if honest:
 					if move == BELIEVE:
 						# If we correctly believe, the cards exit the game.
 						all_cards = []
-						for tup in self.round:
-							current_pid, current_cards = tup[0], tup[3]
+						for (current_pid, play) in self.round:
+							current_cards = play.cards
 							all_cards += current_cards
 							# Each player gains the information that the cards
 							# they played go out.
@@ -346,12 +357,15 @@ class RussianBS:
 						# In addition, all of the other players learn that this player
 						# gets all of the cards.
 						all_cards = []
-						for i in range(len(self.round)):
-							all_cards += self.round[i][3]
+						for (current_pid, play) in self.round:
+							all_cards += play.cards
 						# Now give the cards to the current player, and information
 						# to the other players.
 						for player in self.player_list:
 							player.addCards(self.turn, all_cards)
+						self.record.pickups[self.turn] += len(all_cards)
+						if self.bus.pickup:
+							events.emit(self.bus.pickup, events.PickupEvent(self.turn, all_cards))
 				# The last player did lie.
 				else:
 					if move == BELIEVE:
@@ -359,22 +373,28 @@ class RussianBS:
 						# In addition, all of the other players learn that this player
 						# gets all of the cards.
 						all_cards = []
-						for i in range(len(self.round)):
-							all_cards += self.round[i][3]
+						for (current_pid, play) in self.round:
+							all_cards += play.cards
 						# Now give the cards to the current player, and information
 						# to the other players.
 						for player in self.player_list:
 							player.addCards(self.turn, all_cards)
+						self.record.pickups[self.turn] += len(all_cards)
+						if self.bus.pickup:
+							events.emit(self.bus.pickup, events.PickupEvent(self.turn, all_cards))
 					elif move == BS:
 						# We guessed right, so the previous player takes all of the
 						# cards and each player learns the cards played.
 						all_cards = []
-						for i in range(len(self.round)):
-							all_cards += self.round[i][3]
+						for (current_pid, play) in self.round:
+							all_cards += play.cards
 						# Now give the cards to the previous player, and information
 						# to the other players.
 						for player in self.player_list:
-							player.addCards(self.turn - 1, all_cards)
+							player.addCards(last_pid, all_cards)
+						self.record.pickups[last_pid] += len(all_cards)
+						if self.bus.pickup:
+							events.emit(self.bus.pickup, events.PickupEvent(last_pid, all_cards))
 						correct = True
 				# Now reset everything for the next round and end the turn.
 				# Update the histories for each player.
@@ -388,10 +408,11 @@ class RussianBS:
 				ended = True
 			# Otherwise, add the move the our internal state.
 			else:
-				(rank, num, cards) = move
-				print "Player %d has played %d cards of rank %s" % (self.turn, num, ranks[rank])
-				tup = (self.turn, rank, num, cards)
-				self.round.append(tup)
+				if self.bus.play:
+					events.emit(self.bus.play, events.PlayEvent(self.turn, move.rank, move.count, move.cards))
+				if not move.isHonest():
+					self.record.bluffs[self.turn] += 1
+				self.round.append((self.turn, move))
 				self.turn = (self.turn + 1) % self.nplayers
 
 	# A player has won if they have no cards at the end of their turn.
@@ -401,17 +422,6 @@ class RussianBS:
 				return player.getPID()
 		return -1
 
-	# Given a move, determines whether the player lied while making the move.
-	def isEqual(self, move):
-		(PID, rank, number, cards) = move
-		if len(cards) == number:
-			for card in cards:
-				if card % 13 != rank:
-					return False
-			return True
-		else:
-			return False
-
 # GAME FUNCTIONS-------------------------------------------------------------//
 
 # Runs a game of RussianBS, using the classes defined above.
@@ -425,7 +435,7 @@ def playGame():
 			AI[i] = True
 		else:
 			AI[i] = False
-	game = RussianBS(nplayers, AI)
+	game = RussianBS(nplayers, AI, bus = events.EventBus([ConsoleObserver()]))
 	game.runGame()
 	q = raw_input("Quit?>> ")
 	if q == "Y":
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Time controls for simulated games.
+
+A TimeControl says how much thinking time each seat gets per move and per
+game. For each game the engine makes a GameClock, which hands a Deadline to
+the player before every move and charges the time actually taken to that
+player's seat.
+
+Python can't interrupt a player mid-move, so time controls are cooperative:
+anytime players poll their Deadline and return the best move found so far
+when it expires. A seat that runs out of game time, or blows through its
+per-move budget more often than the control allows, is flagged. From then
+on the engine plays its instant fallback move instead of asking it, which
+keeps the wall-clock time of a game (and so of a tournament) bounded.
+"""
+
+import time
+
+clock = time.time
+
+
+class TimeControl:
+    """
+    Per-move and per-game budgets in seconds. Either may be None for no
+    limit. A move that takes more than perMove + grace seconds is an
+    overrun; maxOverruns is the number of overruns a seat may make before it
+    is flagged. grace absorbs the last step an anytime search takes after
+    its deadline.
+    """
+
+    def __init__(self, perMove=None, perGame=None, maxOverruns=0, grace=0.0):
+        self.perMove = perMove
+        self.perGame = perGame
+        self.maxOverruns = maxOverruns
+        self.grace = grace
+
+
+class Deadline(object):
+    """
+    The moment a player's current move has to be returned by. at is a
+    clock() value, or None if the move is untimed.
+    """
+    __slots__ = ("at",)
+
+    def __init__(self, at):
+        self.at = at
+
+    def remaining(self):
+        """
+        Returns the seconds left, or None if the move is untimed.
+        """
+        if self.at is None:
+            return None
+        return max(0.0, self.at - clock())
+
+    def expired(self):
+        """
+        Returns True once the deadline has passed.
+        """
+        return self.at is not None and clock() >= self.at
+
+
+class GameClock:
+    """
+    Time accounting for one game. used, overruns and flagged are indexed by
+    seat. If onMove is given, it is called with the seconds each move took.
+    """
+
+    def __init__(self, control, numSeats, onMove=None):
+        self.control = control
+        self.onMove = onMove
+        self.used = [0.0] * numSeats
+        self.overruns = [0] * numSeats
+        self.flagged = [False] * numSeats
+        self.started = None
+
+    def startMove(self, seat):
+        """
+        Starts timing a move for the given seat and returns its Deadline:
+        the per-move budget, capped by whatever is left of the game budget.
+        """
+        budget = self.control.perMove
+        if self.control.perGame is not None:
+            left = self.control.perGame - self.used[seat]
+            budget = left if budget is None else min(budget, left)
+        self.started = clock()
+        return Deadline(None if budget is None else self.started + budget)
+
+    def stopMove(self, seat):
+        """
+        Charges the time since startMove() to the seat, flagging it if it
+        has now used up its allowance. Returns the seconds taken.
+        """
+        elapsed = clock() - self.started
+        self.used[seat] += elapsed
+        if self.onMove is not None:
+            self.onMove(elapsed)
+        control = self.control
+        if control.perMove is not None and elapsed > control.perMove + control.grace:
+            self.overruns[seat] += 1
+            if self.overruns[seat] > control.maxOverruns:
+                self.flagged[seat] = True
+        if control.perGame is not None and self.used[seat] >= control.perGame:
+            self.flagged[seat] = True
+        return elapsed
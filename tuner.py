@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Genetic algorithm for tuning ParamPlayer (myRussian.py) against a fixed
+field of opponents.
+
+The fitness of a parameter vector is its win rate over a fixed list of game
+seeds. A seed fixes the deal, the seating and every random choice in the
+game, so all candidates are compared on the same games (common random
+numbers). Games are farmed out to a process pool in batches, and each
+(params, seed) result is cached. An elite that survives into the next
+generation, or a child that happens to equal an earlier candidate, is never
+replayed.
+
+Candidates are evaluated a batch of seeds at a time. After each batch, any
+candidate whose win rate, even two standard errors up, can't reach the best
+candidate's is dropped, so clearly bad candidates cost one batch instead of
+maxGames games. Candidates are ranked first by how many games they lasted
+and only then by win rate, so a candidate dropped early can't outrank one
+that survived on the strength of a lucky first batch.
+
+Every game gets a fresh OpponentStore, so the tuned player's modelWeight has
+opponent models to use but they only hold what was seen earlier in that
+game. Carrying a store across games would make a game's result depend on
+which games the same worker happened to play before it, and the cache
+relies on (params, seed) fixing the result.
+"""
+
+import math
+import multiprocessing
+import random
+
+import myRussian
+import opponents
+
+
+def playSeededGame(params, opponentTypes, seed):
+    """
+    Plays one game of a ParamPlayer with the given params against one of
+    each opponent type, with everything random fixed by seed, and a fresh
+    opponent store. Returns 1 if the ParamPlayer won, otherwise 0.
+    """
+    random.seed(seed)
+    tuned = myRussian.ParamPlayer(params)
+    players = [tuned] + [opponentType() for opponentType in opponentTypes]
+    random.shuffle(players)
+    myRussian.playGame(players, opponents=opponents.OpponentStore())
+    return 0 if tuned.getHand() else 1
+
+
+def evaluateBatch(task):
+    """
+    Pool entry point: plays the games for one (params, opponentTypes, seeds)
+    task and returns their results in seed order.
+    """
+    params, opponentTypes, seeds = task
+    return [playSeededGame(params, opponentTypes, seed) for seed in seeds]
+
+
+class Tuner:
+    """
+    Tunes ParamPlayer parameters against opponentTypes.
+
+    Each generation has populationSize candidates. The eliteCount best carry
+    over unchanged; the rest are children of two tournament-selected parents
+    (uniform crossover, Gaussian mutation of scale mutationScale, clipped to
+    [0, 1] and rounded to `digits` places so repeats hit the cache).
+    Candidates play at most maxGames games, batchSize at a time.
+    """
+
+    def __init__(self, opponentTypes, populationSize=16, eliteCount=4,
+                 batchSize=50, maxGames=400, mutationScale=0.1, digits=3,
+                 processes=None, seed=None):
+        self.opponentTypes = opponentTypes
+        self.populationSize = populationSize
+        self.eliteCount = eliteCount
+        self.batchSize = batchSize
+        self.maxGames = maxGames
+        self.mutationScale = mutationScale
+        self.digits = digits
+        self.rng = random.Random(seed)
+        self.seeds = [self.rng.getrandbits(32) for i in range(maxGames)]
+        self.cache = {}
+        self.gamesPlayed = 0
+        self.processes = processes or multiprocessing.cpu_count()
+        self.pool = multiprocessing.Pool(self.processes)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def clip(self, x):
+        return round(min(1.0, max(0.0, x)), self.digits)
+
+    def randomParams(self):
+        return tuple(self.clip(self.rng.random())
+                     for i in range(len(myRussian.ParamPlayer.defaults)))
+
+    def results(self, params, n):
+        """
+        Returns the cached results of params on the first n seeds.
+        """
+        return [self.cache[(params, seed)] for seed in self.seeds[:n]]
+
+    def evaluate(self, population):
+        """
+        Returns a dict mapping each distinct candidate to its fitness, a
+        (games played, win rate) pair. Candidates that played the same
+        number of games played the same seeds, so their win rates are
+        comparable; the survivors all played maxGames.
+        """
+        active = list(set(population))
+        played = dict((params, 0) for params in active)
+        n = 0
+        while active and n < self.maxGames:
+            seeds = self.seeds[n:n + self.batchSize]
+            n += len(seeds)
+            missing = dict((params, [seed for seed in seeds if (params, seed) not in self.cache])
+                           for params in active)
+            # Split the work into a few tasks per process so every core stays
+            # busy even once only a handful of candidates are left.
+            chunk = max(1, sum(len(m) for m in missing.values()) / (4 * self.processes))
+            tasks = [(params, self.opponentTypes, m[i:i + chunk])
+                     for params, m in missing.items() for i in range(0, len(m), chunk)]
+            for task, results in zip(tasks, self.pool.map(evaluateBatch, tasks, 1)):
+                for seed, result in zip(task[2], results):
+                    self.cache[(task[0], seed)] = result
+                self.gamesPlayed += len(results)
+            for params in active:
+                played[params] = n
+
+            means = dict((params, sum(self.results(params, n)) / float(n)) for params in active)
+            best = max(means.values())
+            survivors = []
+            for params in active:
+                p = means[params]
+                stderr = math.sqrt((p * (1 - p) + 1.0 / n) / n)
+                if p + 2 * stderr >= best:
+                    survivors.append(params)
+            active = survivors
+
+        return dict((params, (played[params],
+                              sum(self.results(params, played[params])) / float(played[params])))
+                    for params in played)
+
+    def select(self, ranked, fitness):
+        """
+        Tournament selection: the fitter of two random candidates.
+        """
+        a, b = self.rng.choice(ranked), self.rng.choice(ranked)
+        return a if fitness[a] >= fitness[b] else b
+
+    def breed(self, ranked, fitness):
+        a, b = self.select(ranked, fitness), self.select(ranked, fitness)
+        return tuple(self.clip(self.rng.choice((x, y)) + self.rng.gauss(0, self.mutationScale))
+                     for x, y in zip(a, b))
+
+    def run(self, generations, verbose=False):
+        """
+        Runs the given number of generations, starting from the defaults
+        plus random candidates. Returns the best (params, win rate) found.
+        """
+        population = [myRussian.ParamPlayer.defaults]
+        while len(population) < self.populationSize:
+            population.append(self.randomParams())
+        best = None
+        for g in range(generations):
+            fitness = self.evaluate(population)
+            ranked = sorted(fitness, key=fitness.get, reverse=True)
+            if best is None or fitness[ranked[0]] >= best[1]:
+                best = (ranked[0], fitness[ranked[0]])
+            if verbose:
+                print ("Generation " + str(g) + ": best " + str(ranked[0]) +
+                       " wins " + str(fitness[ranked[0]][1]) + " (" +
+                       str(self.gamesPlayed) + " games played so far)")
+            population = ranked[:self.eliteCount]
+            while len(population) < self.populationSize:
+                population.append(self.breed(ranked, fitness))
+        return best[0], best[1][1]
+
+
+if __name__ == '__main__':
+    tuner = Tuner([myRussian.RandomAI1Player, myRussian.RandomAI2Player,
+                   myRussian.NaivePlayer], seed=0)
+    params, fitness = tuner.run(10, verbose=True)
+    tuner.close()
+    print "Best parameters: " + str(params) + " with win rate " + str(fitness)